@@ -0,0 +1,42 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+"""Compiled scalar kernels for the per-frame hot path.
+
+Deployment builds that cannot afford numba's import/JIT latency can compile
+these once at install time instead:
+
+    python setup.py build_ext --inplace
+
+demo.py picks the compiled ray_cast up automatically when the extension is
+importable and falls back to numba, then pure Python, otherwise.
+"""
+
+from libc.math cimport hypot
+
+
+cpdef bint ray_cast(double px, double py, double[::1] poly_x, double[::1] poly_y):
+    """Point-in-polygon by ray casting over contiguous vertex arrays."""
+    cdef Py_ssize_t i, j, n = poly_x.shape[0]
+    cdef bint inside = False, cross
+    cdef double y1, y2, xint
+    for i in range(n):
+        j = (i + 1) % n
+        y1 = poly_y[i]; y2 = poly_y[j]
+        # Branchless crossing test: xint is computed unconditionally (the
+        # epsilon guards horizontal edges, where cross is False anyway), so
+        # the loop body is straight-line code the compiler can vectorize.
+        cross = (y1 > py) != (y2 > py)
+        xint = (py - y1) * (poly_x[j] - poly_x[i]) / (y2 - y1 + 1e-18) + poly_x[i]
+        inside ^= cross & (px < xint)
+    return inside
+
+
+cpdef double speed_mps(double dx, double dy, double dt, double pix_to_m):
+    """Scalar speed in m/s from a pixel displacement over dt seconds."""
+    if dt <= 0:
+        return 0.0
+    return hypot(dx, dy) * pix_to_m / dt
+
+
+cpdef double dist_sq(double ax, double ay, double bx, double by):
+    """Squared Euclidean distance, for threshold comparisons without sqrt."""
+    return (ax - bx) * (ax - bx) + (ay - by) * (ay - by)
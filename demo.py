@@ -1,7 +1,49 @@
 #CSES - City Security Evaluation System (Algorithm for Threat Detection)
+import heapq
+import math
 import time
+from functools import lru_cache
 from typing import List, Dict, Tuple, Any
 
+import numpy as np
+
+try:
+    # Compiled extension (python setup.py build_ext --inplace): preferred in
+    # deployment builds, where numba's import and JIT latency is unwelcome.
+    from cses_kernels import ray_cast as _compiled_ray_cast
+except ImportError:
+    _compiled_ray_cast = None
+
+try:
+    from numba import njit
+except ImportError:  # numba is an optional accelerator; fall back to pure Python
+    njit = None
+
+
+def _ray_cast_py(px: float, py: float, poly_x: np.ndarray, poly_y: np.ndarray) -> bool:
+    n = poly_x.shape[0]
+    inside = False
+    for i in range(n):
+        j = (i + 1) % n
+        y1 = poly_y[i]; y2 = poly_y[j]
+        # Branchless crossing test: xint is computed unconditionally (the
+        # epsilon guards horizontal edges, where cross is False anyway), so
+        # the loop body is straight-line code the JIT can vectorize.
+        cross = (y1 > py) != (y2 > py)
+        xint = (py - y1) * (poly_x[j] - poly_x[i]) / (y2 - y1 + 1e-18) + poly_x[i]
+        inside ^= cross & (px < xint)
+    return inside
+
+
+if _compiled_ray_cast is not None:
+    _ray_cast = _compiled_ray_cast
+elif njit is not None:
+    _ray_cast = njit(cache=True, fastmath=True)(_ray_cast_py)
+    # Warm the JIT at import time so the first frame does not pay the compile hit.
+    _ray_cast(0.0, 0.0, np.zeros(3, dtype=np.float64), np.zeros(3, dtype=np.float64))
+else:
+    _ray_cast = _ray_cast_py
+
 # --- CONFIGURATION ---
 CONFIG = {
     'PRUNE_AGE_S': 5.0,
@@ -9,13 +51,51 @@ CONFIG = {
     'STOP_SPEED_THRESHOLD_MPS': 0.5,
     'ANOMALY_THRESHOLD': 0.7,
     'ALERT_PROBABILITY_THRESHOLD': 0.75,
+    'MAX_ALERTS': None,  # cap on alerts returned per frame; None = unbounded
 }
 
+# Gates the per-transition debug prints in the behavioral engine.
+DEBUG = True
+
+# Hot-path bindings: the per-frame code reads these module constants instead of
+# paying a CONFIG dict hash on every track every frame.
+PRUNE_AGE_S = CONFIG['PRUNE_AGE_S']
+PIX_TO_M = CONFIG['PIXELS_TO_METERS']
+STOP_TH = CONFIG['STOP_SPEED_THRESHOLD_MPS']
+ANOMALY_TH = CONFIG['ANOMALY_THRESHOLD']
+ALERT_TH = CONFIG['ALERT_PROBABILITY_THRESHOLD']
+MAX_ALERTS = CONFIG['MAX_ALERTS']
+
+# Driver-exit proximity radius (px); doubles as the cell size of the per-frame
+# uniform grid over newly-appeared pedestrians, so any pedestrian within the
+# radius of a vehicle is guaranteed to sit in one of the 9 neighbouring cells.
+DRIVER_EXIT_RADIUS_PX = 50
+_DRIVER_EXIT_R2 = DRIVER_EXIT_RADIUS_PX * DRIVER_EXIT_RADIUS_PX
+
+# Labels are interned to small ints at detection time (0 = unknown), so the
+# hot-path class checks are an integer compare or a bitmask AND instead of
+# string comparisons against a rebuilt list.
+LABEL_IDS: Dict[str, int] = {'van': 1, 'truck': 2, 'car': 3, 'pedestrian': 4}
+PEDESTRIAN_ID = LABEL_IDS['pedestrian']
+VEHICLE_MASK = (1 << LABEL_IDS['van']) | (1 << LABEL_IDS['truck']) | (1 << LABEL_IDS['car'])
+
 # --- DATA STRUCTURES (as would be received from a Model API) ---
 Detection = Dict[str, Any]
 FrameData = Dict[str, Any]
 TrackedObject = Dict[str, Any]
 
+# Per-track position history lives in fixed-size ring buffers ('xs'/'ys'/'ts'
+# arrays plus a 'head' cursor) instead of a growing list of dicts. The length
+# is a power of two so wraparound is a single mask.
+HISTORY_LEN = 64
+_HISTORY_MASK = HISTORY_LEN - 1
+
+
+def _track_pos(track: TrackedObject, back: int = 0) -> Tuple[float, float]:
+    """Position of a track `back` observations ago (0 = most recent)."""
+    h = (track['head'] - 1 - back) & _HISTORY_MASK
+    return float(track['xs'][h]), float(track['ys'][h])
+
 # ==============================================================================
 # LAYER 2: BASELINE ANOMALY DETECTION (The "Gut Feeling")
 # ==============================================================================
@@ -24,27 +104,107 @@ class BaselineModel:
     def __init__(self):
         self.normal_road_polygon = [(0, 220), (1000, 220), (1000, 300), (0, 300)]
         self.normal_stopping_polygon = [(800, 220), (900, 220), (900, 300), (800, 300)]
+        # Pre-computed edge arrays so the vectorized ray-cast never rebuilds them.
+        self._road_edges = self._polygon_edges(self.normal_road_polygon)
+        self._stop_edges = self._polygon_edges(self.normal_stopping_polygon)
+        # Contiguous vertex arrays for the scalar (JIT-compiled) ray-cast kernel.
+        self.road_x, self.road_y = self._polygon_xy(self.normal_road_polygon)
+        self.stop_x, self.stop_y = self._polygon_xy(self.normal_stopping_polygon)
+        # Cached AABBs: a cheap reject before any ray-cast, and an exact answer
+        # for the 4-vertex axis-aligned rectangles the simulation uses.
+        self.road_bbox = self._polygon_bbox(self.normal_road_polygon)
+        self.stop_bbox = self._polygon_bbox(self.normal_stopping_polygon)
+        # Positions are integer pixel coordinates and the polygons are fixed
+        # for the model's lifetime, so repeated scalar queries (a stopped
+        # vehicle re-tested every frame) are answered from a small cache
+        # instead of re-running the ray-cast.
+        self._road_test_cached = lru_cache(maxsize=4096)(self._road_test)
+        self._stop_test_cached = lru_cache(maxsize=4096)(self._stop_test)
 
-    def _is_point_in_polygon(self, point: Tuple[int, int], polygon: List[Tuple[int, int]]) -> bool:
-        x, y = point; n = len(polygon); inside = False
-        p1x, p1y = polygon[0]
-        for i in range(n + 1):
-            p2x, p2y = polygon[i % n]
-            if y > min(p1y, p2y) and y <= max(p1y, p2y) and x <= max(p1x, p2x):
-                if p1y != p2y: xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y) + p1x
-                if p1x == p2x or x <= xinters: inside = not inside
-            p1x, p1y = p2x, p2y
+    def _road_test(self, xi: int, yi: int) -> bool:
+        return bool(_ray_cast(float(xi), float(yi), self.road_x, self.road_y))
+
+    def _stop_test(self, xi: int, yi: int) -> bool:
+        return bool(_ray_cast(float(xi), float(yi), self.stop_x, self.stop_y))
+
+    @staticmethod
+    def _polygon_bbox(polygon: List[Tuple[int, int]]) -> Tuple[float, float, float, float]:
+        poly = np.asarray(polygon, dtype=np.float64)
+        return (float(np.min(poly[:, 0])), float(np.min(poly[:, 1])),
+                float(np.max(poly[:, 0])), float(np.max(poly[:, 1])))
+
+    @staticmethod
+    def _in_bbox(pt: Tuple[float, float], bbox: Tuple[float, float, float, float]) -> bool:
+        return bbox[0] <= pt[0] <= bbox[2] and bbox[1] <= pt[1] <= bbox[3]
+
+    @staticmethod
+    def _polygon_xy(polygon: List[Tuple[int, int]]) -> Tuple[np.ndarray, np.ndarray]:
+        poly = np.asarray(polygon, dtype=np.float64)
+        return np.ascontiguousarray(poly[:, 0]), np.ascontiguousarray(poly[:, 1])
+
+    @staticmethod
+    def _polygon_edges(polygon: List[Tuple[int, int]]):
+        poly = np.asarray(polygon, dtype=np.float64)
+        return poly[:, 0], poly[:, 1], np.roll(poly[:, 0], -1), np.roll(poly[:, 1], -1)
+
+    @staticmethod
+    def _points_in_polygon(x: np.ndarray, y: np.ndarray, edges) -> np.ndarray:
+        """Vectorized ray-casting: tests all points against one polygon at once."""
+        x1, y1, x2, y2 = edges
+        px = x[:, None]; py = y[:, None]
+        cond = (y1 > py) != (y2 > py)
+        xints = (py - y1) * (x2 - x1) / (y2 - y1 + 1e-18) + x1
+        return np.bitwise_xor.reduce(cond & (px < xints), axis=1)
+
+    def _points_in_region(self, x: np.ndarray, y: np.ndarray, polygon: List[Tuple[int, int]],
+                          bbox: Tuple[float, float, float, float], edges) -> np.ndarray:
+        """Vectorized containment: AABB compares first, ray-cast only if needed."""
+        inside = (x >= bbox[0]) & (x <= bbox[2]) & (y >= bbox[1]) & (y <= bbox[3])
+        if len(polygon) > 4:
+            inside &= self._points_in_polygon(x, y, edges)
         return inside
 
+    def _is_point_in_polygon(self, point: Tuple[int, int], polygon: List[Tuple[int, int]]) -> bool:
+        poly_x, poly_y = self._polygon_xy(polygon)
+        return bool(_ray_cast(float(point[0]), float(point[1]), poly_x, poly_y))
+
+    def _contains(self, px: float, py: float, polygon: List[Tuple[int, int]],
+                  bbox: Tuple[float, float, float, float], cached_test) -> bool:
+        if not (bbox[0] <= px <= bbox[2] and bbox[1] <= py <= bbox[3]):
+            return False
+        if len(polygon) > 4:  # only true polygons need the full ray-cast
+            return cached_test(int(px), int(py))
+        return True
+
+    def score_point(self, px: float, py: float, is_stopped: bool) -> float:
+        # Both anomaly kinds carry the same 0.95 score, so the old
+        # max(location, stop) was moot — return on the first hit and skip the
+        # stopping-zone test whenever the track is off-road or still moving.
+        if not self._contains(px, py, self.normal_road_polygon, self.road_bbox, self._road_test_cached):
+            return 0.95
+        if is_stopped and not self._contains(px, py, self.normal_stopping_polygon, self.stop_bbox, self._stop_test_cached):
+            return 0.95
+        return 0.0
+
     def calculate_anomaly_score(self, track: TrackedObject, is_stopped: bool) -> float:
-        current_pos = track['history'][-1]['pos']
-        location_anomaly = 0.0
-        if not self._is_point_in_polygon(current_pos, self.normal_road_polygon):
-            location_anomaly = 0.95
-        stop_anomaly = 0.0
-        if is_stopped and not self._is_point_in_polygon(current_pos, self.normal_stopping_polygon):
-            stop_anomaly = 0.95
-        return max(location_anomaly, stop_anomaly)
+        px, py = track['pos']
+        return self.score_point(px, py, is_stopped)
+
+    def calculate_anomaly_scores(self, x: np.ndarray, y: np.ndarray,
+                                 is_stopped_mask: np.ndarray) -> np.ndarray:
+        """Batched anomaly scoring over position columns, one ray-cast per polygon."""
+        n = len(x)
+        if n == 0:
+            return np.zeros(0, dtype=np.float64)
+        if n <= 2:
+            # Scalar JIT kernel beats the broadcasting setup cost for tiny scenes.
+            return np.array([
+                self.score_point(float(x[i]), float(y[i]), bool(is_stopped_mask[i]))
+                for i in range(n)], dtype=np.float64)
+        in_road = self._points_in_region(x, y, self.normal_road_polygon, self.road_bbox, self._road_edges)
+        in_stop = self._points_in_region(x, y, self.normal_stopping_polygon, self.stop_bbox, self._stop_edges)
+        stopped = np.asarray(is_stopped_mask, dtype=bool)
+        return np.where(~in_road | (stopped & ~in_stop), 0.95, 0.0)
 
 # ==============================================================================
 # LAYER 3: BEHAVIORAL ANALYSIS ENGINE (The "Brain")
@@ -56,48 +216,61 @@ class BehavioralEngine:
         self.active_scenarios: Dict[int, Dict] = {}
 
     def _load_playbooks(self):
-        # FINAL FIX: The 'states' and 'triggers' lists are now perfectly aligned.
-        # 'triggers[0]' now correctly corresponds to 'states[0]'.
+        # Trigger evaluation is fused into one advance method per playbook
+        # (state index N advances to state 'states[N]'): a single call with a
+        # switch on the state index, instead of indexing a lambda list and
+        # paying a closure call per check.
         return {
             "VBIED_DROPOFF": {
                 'states': ['STOPPED_IN_ANOMALOUS_ZONE', 'DRIVER_EXIT', 'SEPARATION'],
-                'triggers': [
-                    lambda track, ctx: len(track['history']) > 1 and ctx['is_stopped'] and ctx['anomaly_score'] > CONFIG['ANOMALY_THRESHOLD'],
-                    lambda track, ctx: self._check_driver_exit(track, ctx),
-                    lambda track, ctx: self._check_driver_separation(track, ctx)
-                ]
+                'advance': self._vbied_advance,
             }
         }
-    
+
+    def _vbied_advance(self, state_index: int, track: TrackedObject, context: Dict) -> bool:
+        """Trigger for advancing a VBIED_DROPOFF scenario into state_index."""
+        if state_index == 0:
+            return track['count'] > 1 and context['is_stopped'] and context['anomaly_score'] > ANOMALY_TH
+        if state_index == 1:
+            return self._check_driver_exit(track, context)
+        return self._check_driver_separation(track, context)
+
     def _check_driver_exit(self, vehicle_track: TrackedObject, context: Dict) -> bool:
-        vehicle_pos = vehicle_track['history'][-1]['pos']
-        for other_obj in context['all_tracks'].values():
-            if other_obj['label'] == 'pedestrian' and len(other_obj['history']) == 1:
-                ped_pos = other_obj['history'][-1]['pos']
-                dist = ((vehicle_pos[0] - ped_pos[0])**2 + (vehicle_pos[1] - ped_pos[1])**2)**0.5
-                if dist < 50:
-                    self.active_scenarios[vehicle_track['obj_id']]['linked_obj_id'] = other_obj['obj_id']
-                    return True
+        grid = context['new_peds_grid']
+        if not grid: return False
+        vx, vy = vehicle_track['pos']
+        cx = int(vx) // DRIVER_EXIT_RADIUS_PX; cy = int(vy) // DRIVER_EXIT_RADIUS_PX
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for ped_id, px, py in grid.get((cx + dx, cy + dy), ()):
+                    if (vx - px) * (vx - px) + (vy - py) * (vy - py) < _DRIVER_EXIT_R2:
+                        self.active_scenarios[vehicle_track['obj_id']]['linked_obj_id'] = ped_id
+                        return True
         return False
 
     def _check_driver_separation(self, vehicle_track: TrackedObject, context: Dict) -> bool:
         if 'linked_obj_id' not in self.active_scenarios.get(vehicle_track['obj_id'], {}): return False
         ped_id = self.active_scenarios[vehicle_track['obj_id']]['linked_obj_id']
-        if ped_id not in context['all_tracks'] or len(context['all_tracks'][ped_id]['history']) < 2: return False
+        if ped_id not in context['all_tracks'] or context['all_tracks'][ped_id]['count'] < 2: return False
         ped_track = context['all_tracks'][ped_id]
-        ped_pos_curr = ped_track['history'][-1]['pos']; ped_pos_prev = ped_track['history'][-2]['pos']
-        vehicle_pos = vehicle_track['history'][-1]['pos']
-        dist_curr = ((vehicle_pos[0] - ped_pos_curr[0])**2 + (vehicle_pos[1] - ped_pos_curr[1])**2)**0.5
-        dist_prev = ((vehicle_pos[0] - ped_pos_prev[0])**2 + (vehicle_pos[1] - ped_pos_prev[1])**2)**0.5
-        if dist_curr > dist_prev and context['speeds'][ped_id] > CONFIG['STOP_SPEED_THRESHOLD_MPS']: return True
+        cx, cy = ped_track['pos']; px, py = ped_track['prev_pos']
+        vx, vy = vehicle_track['pos']
+        # Squared distances: monotone under sqrt, so the comparison is identical.
+        dist_curr_sq = (vx - cx) * (vx - cx) + (vy - cy) * (vy - cy)
+        dist_prev_sq = (vx - px) * (vx - px) + (vy - py) * (vy - py)
+        ped_speed = context['speeds'][context['slot_of'][ped_id]]
+        if dist_curr_sq > dist_prev_sq and ped_speed > STOP_TH: return True
         return False
 
     def update_scenarios(self, track: TrackedObject, context: Dict) -> bool:
-        """Updates playbook states and returns True if a state has just changed."""
+        """Updates playbook states and returns True if a state has just changed.
+
+        Callers are expected to gate on vehicle class; only vehicle tracks
+        can open or advance a scenario.
+        """
         state_just_changed = False
-        if track['obj_id'] not in self.active_scenarios and context['anomaly_score'] > CONFIG['ANOMALY_THRESHOLD']:
-            if track['label'] in ['van', 'truck', 'car']:
-                self.active_scenarios[track['obj_id']] = {'playbook': "VBIED_DROPOFF", 'state_index': -1}
+        if track['obj_id'] not in self.active_scenarios and context['anomaly_score'] > ANOMALY_TH:
+            self.active_scenarios[track['obj_id']] = {'playbook': "VBIED_DROPOFF", 'state_index': -1}
 
         if track['obj_id'] in self.active_scenarios:
             scenario = self.active_scenarios[track['obj_id']]
@@ -105,13 +278,13 @@ class BehavioralEngine:
             current_state_index = scenario['state_index']
             next_state_index = current_state_index + 1
 
-            if next_state_index < len(playbook['triggers']):
-                trigger_func = playbook['triggers'][next_state_index]
-                if trigger_func(track, context):
+            if next_state_index < len(playbook['states']):
+                if playbook['advance'](next_state_index, track, context):
                     scenario['state_index'] += 1
                     state_just_changed = True
-                    new_state = playbook['states'][scenario['state_index']]
-                    print(f"DEBUG: Object {track['obj_id']} advanced to state '{new_state}' in playbook '{scenario['playbook']}'")
+                    if DEBUG:
+                        new_state = playbook['states'][scenario['state_index']]
+                        print(f"DEBUG: Object {track['obj_id']} advanced to state '{new_state}' in playbook '{scenario['playbook']}'")
         
         return state_just_changed
 
@@ -129,6 +302,12 @@ class BehavioralEngine:
 # ==============================================================================
 class ThreatSynthesizer:
     """Fuses all evidence using a probabilistic model to calculate threat likelihood."""
+
+    PRIOR = 0.0001
+    _PRIOR_LOG_ODDS = math.log(PRIOR / (1.0 - PRIOR))
+    _LOG_ANOMALY_BUMP = math.log(1.05)
+    _LOGIT_ALERT_TH = math.log(ALERT_TH / (1.0 - ALERT_TH))
+
     def __init__(self):
         self.likelihoods = {
             'VBIED_DROPOFF': {
@@ -137,42 +316,53 @@ class ThreatSynthesizer:
                 'state_SEPARATION': 100.0,
             }
         }
-        self.threat_probabilities: Dict[int, Dict[str, float]] = {}
+        # Evidence is accumulated in log-odds: each update is one add, with no
+        # overflow cap and no FP error compounding from repeated multiplies.
+        self.log_likelihoods = {
+            playbook: {k: math.log(v) for k, v in table.items()}
+            for playbook, table in self.likelihoods.items()
+        }
+        self.log_odds: Dict[int, Dict[str, float]] = {}
 
     def update_threat_probabilities(self, obj_id: int, evidence: Dict):
-        if obj_id not in self.threat_probabilities:
-            self.threat_probabilities[obj_id] = {'VBIED_DROPOFF': 0.0001}
+        if obj_id not in self.log_odds:
+            self.log_odds[obj_id] = {'VBIED_DROPOFF': self._PRIOR_LOG_ODDS}
 
         playbook_info = evidence.get('playbook_info')
         state_just_changed = evidence.get('state_just_changed', False)
-        
-        multiplier = 1.0
+
+        log_mult = 0.0
         if playbook_info and state_just_changed:
             threat_name = playbook_info['name']
             state_name = playbook_info['state']
-            if threat_name in self.likelihoods:
-                multiplier = self.likelihoods[threat_name].get(f'state_{state_name}', 1.0)
-        elif evidence['anomaly_score'] > CONFIG['ANOMALY_THRESHOLD']:
-            multiplier = 1.05
-
-        if multiplier > 1.0:
-            for threat in self.threat_probabilities[obj_id]:
-                 self.threat_probabilities[obj_id][threat] *= multiplier
-        
-        self._normalize(obj_id)
+            if threat_name in self.log_likelihoods:
+                log_mult = self.log_likelihoods[threat_name].get(f'state_{state_name}', 0.0)
+        elif evidence['anomaly_score'] > ANOMALY_TH:
+            log_mult = self._LOG_ANOMALY_BUMP
 
-    def _normalize(self, obj_id: int):
-        for threat, prob in self.threat_probabilities[obj_id].items():
-            if prob > 0.999:
-                self.threat_probabilities[obj_id][threat] = 0.999
+        if log_mult > 0.0:
+            threats = self.log_odds[obj_id]
+            for threat in threats:
+                threats[threat] += log_mult
+
+    def get_probability(self, obj_id: int, threat: str) -> float | None:
+        lo = self.log_odds.get(obj_id, {}).get(threat)
+        return None if lo is None else 1.0 / (1.0 + math.exp(-lo))
 
     def get_prioritized_alerts(self) -> List[Dict]:
-        alerts = []
-        for obj_id, threats in self.threat_probabilities.items():
-            for threat, probability in threats.items():
-                if probability > CONFIG['ALERT_PROBABILITY_THRESHOLD']:
-                    alerts.append({'obj_id': obj_id, 'threat_type': threat, 'probability': probability})
-        return sorted(alerts, key=lambda x: x['probability'], reverse=True)
+        # Filter in log space first so below-threshold entries cost one compare
+        # and are never materialized; log-odds order equals probability order.
+        th = self._LOGIT_ALERT_TH
+        candidates = ((lo, obj_id, threat)
+                      for obj_id, threats in self.log_odds.items()
+                      for threat, lo in threats.items() if lo > th)
+        if MAX_ALERTS is not None:
+            top = heapq.nlargest(MAX_ALERTS, candidates)
+        else:
+            top = sorted(candidates, reverse=True)
+        return [{'obj_id': obj_id, 'threat_type': threat,
+                 'probability': 1.0 / (1.0 + math.exp(-lo))}
+                for lo, obj_id, threat in top]
 
 # ==============================================================================
 # MAIN ORCHESTRATOR
@@ -184,47 +374,166 @@ class ThreatDetector:
         self.baseline_model = BaselineModel()
         self.behavioral_engine = BehavioralEngine()
         self.threat_synthesizer = ThreatSynthesizer()
+        # Compact obj_id -> slot mapping over per-slot column arrays: the whole
+        # per-frame pipeline (speeds, stopped mask, anomaly scores) runs as
+        # vector ops over these columns rather than dict-of-dict traversals.
+        self._slot_of: Dict[int, int] = {}
+        self._ids: List[int | None] = []      # slot -> obj_id (None = free slot)
+        self._labels: List[str | None] = []   # slot -> label
+        self._free_slots: List[int] = []
+        self._capacity = 0
+        self._last_x = self._last_y = self._prev_x = self._prev_y = None
+        self._last_t = self._prev_t = self._last_seen = None
+
+    def _grow_columns(self, needed: int):
+        new_cap = max(16, self._capacity * 2)
+        while new_cap < needed: new_cap *= 2
+        for name in ('_last_x', '_last_y', '_prev_x', '_prev_y'):
+            grown = np.zeros(new_cap, np.float32)
+            if self._capacity: grown[:self._capacity] = getattr(self, name)
+            setattr(self, name, grown)
+        for name in ('_last_t', '_prev_t', '_last_seen'):
+            grown = np.zeros(new_cap, np.float64)
+            if self._capacity: grown[:self._capacity] = getattr(self, name)
+            setattr(self, name, grown)
+        self._capacity = new_cap
         
     def _get_center(self, bbox: Tuple[int, int, int, int]) -> Tuple[int, int]:
         x, y, w, h = bbox; return (x + w // 2, y + h // 2)
 
-    def _update_tracks(self, detections: List[Detection], current_time: float):
+    def _update_tracks(self, detections: List[Detection],
+                       current_time: float) -> List[Tuple[int, float, float]]:
+        """Ingest detections; returns pedestrians first seen this frame."""
+        new_peds: List[Tuple[int, float, float]] = []
         for det in detections:
             obj_id = det['obj_id']
-            center_pos = self._get_center(det['bbox'])
-            if obj_id not in self.tracked_objects:
-                self.tracked_objects[obj_id] = {'obj_id': obj_id, 'label': det['label'], 'history': []}
-            self.tracked_objects[obj_id]['history'].append({'pos': center_pos, 'time': current_time})
-            self.tracked_objects[obj_id]['last_updated'] = current_time
-
-    def _calculate_speed_mps(self, track: TrackedObject) -> float:
-        if len(track['history']) < 2: return 0.0
-        p1=track['history'][-2]; p2=track['history'][-1]
-        dist_m = (((p2['pos'][0]-p1['pos'][0])**2 + (p2['pos'][1]-p1['pos'][1])**2)**0.5) * CONFIG['PIXELS_TO_METERS']
-        time_s = p2['time']-p1['time']
-        return dist_m/time_s if time_s > 0 else 0.0
+            cx, cy = self._get_center(det['bbox'])
+            obj = self.tracked_objects.get(obj_id)
+            if obj is None:
+                if self._free_slots:
+                    slot = self._free_slots.pop()
+                    self._ids[slot] = obj_id
+                    self._labels[slot] = det['label']
+                else:
+                    slot = len(self._ids)
+                    if slot >= self._capacity: self._grow_columns(slot + 1)
+                    self._ids.append(obj_id)
+                    self._labels.append(det['label'])
+                self._slot_of[obj_id] = slot
+                # First sighting: prev == last, so the speed vector op yields 0.
+                self._prev_x[slot] = self._last_x[slot] = cx
+                self._prev_y[slot] = self._last_y[slot] = cy
+                self._prev_t[slot] = self._last_t[slot] = current_time
+                obj = self.tracked_objects[obj_id] = {
+                    'obj_id': obj_id, 'label': det['label'],
+                    'label_id': LABEL_IDS.get(det['label'], 0),
+                    'xs': np.empty(HISTORY_LEN, np.float32),
+                    'ys': np.empty(HISTORY_LEN, np.float32),
+                    'ts': np.empty(HISTORY_LEN, np.float64),
+                    'head': 0, 'count': 0,
+                }
+                # Cached position tuples: every downstream reader uses these
+                # instead of re-indexing the ring buffer.
+                obj['pos'] = obj['prev_pos'] = (float(cx), float(cy))
+                if obj['label_id'] == PEDESTRIAN_ID:
+                    new_peds.append((obj_id, float(cx), float(cy)))
+            else:
+                slot = self._slot_of[obj_id]
+                self._prev_x[slot] = self._last_x[slot]
+                self._prev_y[slot] = self._last_y[slot]
+                self._prev_t[slot] = self._last_t[slot]
+                self._last_x[slot] = cx; self._last_y[slot] = cy
+                self._last_t[slot] = current_time
+                obj['prev_pos'] = obj['pos']
+                obj['pos'] = (float(cx), float(cy))
+            h = obj['head']
+            obj['xs'][h] = cx; obj['ys'][h] = cy; obj['ts'][h] = current_time
+            obj['head'] = (h + 1) & _HISTORY_MASK
+            obj['count'] += 1
+            obj['last_updated'] = current_time
+            self._last_seen[slot] = current_time
+        return new_peds
+
+    def _retire(self, obj_id: int):
+        """Drop a track from every layer and recycle its column slot."""
+        slot = self._slot_of.pop(obj_id)
+        self._ids[slot] = None
+        self._labels[slot] = None
+        self._last_seen[slot] = np.inf  # keeps retired slots out of the stale mask
+        self._free_slots.append(slot)
+        del self.tracked_objects[obj_id]
+        self.behavioral_engine.active_scenarios.pop(obj_id, None)
+        self.threat_synthesizer.log_odds.pop(obj_id, None)
+
+    def _prune_stale(self, current_time: float):
+        n = len(self._ids)
+        if n == 0: return
+        cutoff = current_time - PRUNE_AGE_S
+        for slot in np.nonzero(self._last_seen[:n] < cutoff)[0]:
+            self._retire(self._ids[slot])
+
+    def _compute_speeds(self) -> np.ndarray:
+        """Speeds (m/s) for all slots in one shot, replacing per-track scalar math."""
+        n = len(self._ids)
+        dx = self._last_x[:n] - self._prev_x[:n]
+        dy = self._last_y[:n] - self._prev_y[:n]
+        dt = self._last_t[:n] - self._prev_t[:n]
+        speeds = np.zeros(n, np.float64)
+        np.divide(np.hypot(dx, dy) * PIX_TO_M, dt, out=speeds, where=dt > 0)
+        return speeds
 
     def process_frame_data(self, frame_data: FrameData) -> List[Dict]:
         current_time = frame_data['timestamp']
-        self._update_tracks(frame_data['detections'], current_time)
+        new_peds = self._update_tracks(frame_data['detections'], current_time)
+
+        speeds = self._compute_speeds()
+        stopped = speeds < STOP_TH
+        # Coarse uniform grid over pedestrians first seen this frame, so the
+        # driver-exit check probes 9 cells instead of scanning every track.
+        # _update_tracks collects them as detections arrive — no track scan.
+        new_peds_grid: Dict[Tuple[int, int], List[Tuple[int, float, float]]] = {}
+        for oid, px, py in new_peds:
+            cell = (int(px) // DRIVER_EXIT_RADIUS_PX, int(py) // DRIVER_EXIT_RADIUS_PX)
+            new_peds_grid.setdefault(cell, []).append((oid, px, py))
 
         context = {
             'all_tracks': self.tracked_objects,
-            'speeds': {obj_id: self._calculate_speed_mps(t) for obj_id, t in self.tracked_objects.items()}
+            'speeds': speeds,
+            'slot_of': self._slot_of,
+            'new_peds_grid': new_peds_grid,
         }
 
-        for obj_id, track in self.tracked_objects.items():
-            is_stopped = context['speeds'][obj_id] < CONFIG['STOP_SPEED_THRESHOLD_MPS']
-            anomaly_score = self.baseline_model.calculate_anomaly_score(track, is_stopped)
+        # Anomaly scoring reads the position columns directly — no per-track
+        # gather, no intermediate point list.
+        n = len(self._ids)
+        anomaly_scores = self.baseline_model.calculate_anomaly_scores(
+            self._last_x[:n], self._last_y[:n], stopped)
+
+        for slot in range(n):
+            obj_id = self._ids[slot]
+            if obj_id is None: continue  # recycled slot with no live track
+            track = self.tracked_objects[obj_id]
+            anomaly_score = float(anomaly_scores[slot])
+            # Benign tracks with no behavioral or probabilistic state would
+            # no-op through layers 3/4 — skip the call overhead entirely.
+            if (anomaly_score <= 0.0
+                    and obj_id not in self.behavioral_engine.active_scenarios
+                    and obj_id not in self.threat_synthesizer.log_odds):
+                continue
             context['anomaly_score'] = anomaly_score
-            context['is_stopped'] = is_stopped
-            
-            state_just_changed = self.behavioral_engine.update_scenarios(track, context)
-            playbook_info = self.behavioral_engine.get_matched_playbook_info(obj_id)
+            context['is_stopped'] = bool(stopped[slot])
+
+            state_just_changed = False
+            playbook_info = None
+            if (1 << track['label_id']) & VEHICLE_MASK:  # only vehicles run playbooks
+                state_just_changed = self.behavioral_engine.update_scenarios(track, context)
+                playbook_info = self.behavioral_engine.get_matched_playbook_info(obj_id)
             evidence = {'anomaly_score': anomaly_score, 'playbook_info': playbook_info, 'state_just_changed': state_just_changed}
             self.threat_synthesizer.update_threat_probabilities(obj_id, evidence)
 
-        return self.threat_synthesizer.get_prioritized_alerts()
+        alerts = self.threat_synthesizer.get_prioritized_alerts()
+        self._prune_stale(current_time)
+        return alerts
 
 # ==============================================================================
 # SIMULATION
@@ -256,8 +565,8 @@ if __name__ == "__main__":
         print(f"\n--- Processing Frame at Time: {frame_data['timestamp']:.1f}s ---")
         alerts = detector.process_frame_data(frame_data)
 
-        if 101 in detector.threat_synthesizer.threat_probabilities:
-            prob = detector.threat_synthesizer.threat_probabilities[101]['VBIED_DROPOFF']
+        prob = detector.threat_synthesizer.get_probability(101, 'VBIED_DROPOFF')
+        if prob is not None:
             playbook_info = detector.behavioral_engine.get_matched_playbook_info(101)
             # FINAL FIX: Correctly display "APPROACH" as the default state before a playbook is triggered.
             state = playbook_info['state'] if playbook_info else "APPROACH"
@@ -0,0 +1,7 @@
+from setuptools import setup
+from Cython.Build import cythonize
+
+setup(
+    name='cses-kernels',
+    ext_modules=cythonize('cses_kernels.pyx'),
+)